@@ -1,9 +1,19 @@
 import logging
 
+from containercrop import event_loop, simulate
+from containercrop.github_api import ConnectionSettings
 from containercrop.retention import RetentionArgs, main
 
 if __name__ == "__main__":
-    import asyncio
-
     logging.basicConfig(level=logging.DEBUG)
-    asyncio.run(main(retention_args=RetentionArgs.from_env()))
+    retention_args = RetentionArgs.from_env()
+    connection_settings = ConnectionSettings.from_env()
+    if retention_args.simulate:
+        coro = simulate.main(
+            retention_args, simulate.SimulationArgs.from_env(), connection_settings
+        )
+    else:
+        coro = main(
+            retention_args=retention_args, connection_settings=connection_settings
+        )
+    event_loop.run(coro, event_loop.RuntimeArgs.from_env())
@@ -0,0 +1,330 @@
+"""
+Micro-benchmarks for the retention engine.
+
+Generates synthetic version listings shaped like the GitHub packages API and
+measures throughput (versions processed per second) and peak memory of the
+hot functions. Results can be compared against a stored baseline so that
+accidental quadratic or allocation-heavy changes fail loudly.
+
+Peak memory is deterministic and always checked. Throughput depends on the
+machine, so it is divided by the throughput of a fixed calibration workload
+run in the same process, and only checked with `--check-throughput`.
+
+Usage:
+    python -m containercrop.benchmark                      # compare to baseline
+    python -m containercrop.benchmark --check-throughput   # also gate on speed
+    python -m containercrop.benchmark --update-baseline    # store new baseline
+    python -m containercrop.benchmark --sizes 1000000      # large listings
+"""
+
+import argparse
+import gc
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+
+from pydantic import BaseModel
+
+from containercrop.github_api import Image
+from containercrop.retention import (
+    RetentionArgs,
+    VersionIndex,
+    apply_retention_policy,
+    matches_retention_policy,
+)
+
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_BASELINE = Path(__file__).with_name("benchmark_baseline.json")
+DEFAULT_TOLERANCE = 0.3
+DEFAULT_MEMORY_TOLERANCE = 0.1
+CALIBRATION_SIZE = 50_000
+NOW = datetime(2024, 4, 1, tzinfo=timezone.utc)
+
+
+class BenchmarkResult(BaseModel):
+    "Throughput and peak memory of a single benchmark case"
+    name: str
+    size: int
+    ops_per_sec: float
+    peak_bytes: int
+    relative_speed: float = 0
+    "ops_per_sec divided by the ops_per_sec of the calibration workload"
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.size}]"
+
+    def __str__(self) -> str:
+        return f"{self.key:<45} {self.ops_per_sec:>14,.0f} ops/s {self.relative_speed:>8.3f}x {self.peak_bytes / 2**20:>10.1f} MiB"
+
+
+def _random_tags(rng: random.Random, i: int) -> list[str]:
+    roll = rng.random()
+    if roll < 0.4:
+        return []
+    if roll < 0.6:
+        return [f"sha-{rng.getrandbits(28):07x}"]
+    if roll < 0.8:
+        return [f"pr-{rng.randrange(1, 5000)}", f"sha-{rng.getrandbits(28):07x}"]
+    if roll < 0.95:
+        major, minor, patch = i // 10_000, (i // 100) % 100, i % 100
+        return [f"v{major}.{minor}.{patch}", f"v{major}.{minor}", f"v{major}"]
+    return [rng.choice(["latest", "main", "develop", "nightly"]), f"{i}-rc1"]
+
+
+def generate_entries(count: int, seed: int = 0) -> list[dict]:
+    """
+    Generate `count` fake version entries as returned by the GitHub API.
+    Mixes untagged versions, sha/pr tags, semver tags and floating tags.
+    """
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        updated = NOW - timedelta(seconds=rng.randrange(0, 365 * 24 * 3600))
+        entries.append(
+            {
+                "id": i,
+                "name": f"sha256:{rng.getrandbits(256):064x}",
+                "url": f"https://api.github.com/user/packages/container/bench/versions/{i}",
+                "html_url": f"https://github.com/users/bench/packages/container/bench/{i}",
+                "created_at": updated.isoformat(),
+                "updated_at": updated.isoformat(),
+                "metadata": {
+                    "package_type": "container",
+                    "container": {"tags": _random_tags(rng, i)},
+                },
+            }
+        )
+    return entries
+
+
+def generate_images(count: int, seed: int = 0) -> list[Image]:
+    return [Image.from_github_entry(entry) for entry in generate_entries(count, seed)]
+
+
+def benchmark_policies() -> dict[str, RetentionArgs]:
+    "Wildcard heavy policies representative of real workflows"
+    return {
+        "wildcards": RetentionArgs.model_validate(
+            {
+                "image_name": "bench",
+                "cut_off": "2024-01-01 UTC",
+                "skip_tags": "latest,main,v*.*.*,*-rc*",
+                "filter_tags": "sha-*,pr-*,v*",
+                "keep_at_least": 100,
+                "repo_owner": "bench",
+            }
+        ),
+        "untagged": RetentionArgs.model_validate(
+            {
+                "image_name": "bench",
+                "cut_off": "2024-03-01 UTC",
+                "skip_tags": "",
+                "untagged_only": True,
+                "keep_at_least": 10,
+                "repo_owner": "bench",
+            }
+        ),
+    }
+
+
+def measure(
+    name: str,
+    size: int,
+    func: Callable[[], object],
+    setup: Callable[[], None] | None = None,
+    repeat: int = 3,
+) -> BenchmarkResult:
+    """
+    Run `func` `repeat` times and report the median throughput, then run it
+    once more under tracemalloc to capture the peak memory.
+    `size` is the number of versions processed by a single call.
+    """
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    duration = statistics.median(durations)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=name, size=size, ops_per_sec=size / max(duration, 1e-9), peak_bytes=peak
+    )
+
+
+def _calibration_workload() -> None:
+    "Fixed pure Python work resembling the benchmarks: strings, dicts, sorting"
+    rows = [
+        {"name": f"sha-{i * 7919 % 100_003:07x}", "tags": [str(i)]}
+        for i in range(CALIBRATION_SIZE)
+    ]
+    names = sorted(str(row["name"]) for row in rows)
+    sum(name.startswith("sha-1") for name in names)
+
+
+def calibrate(repeat: int = 5) -> float:
+    "Throughput of the calibration workload on this machine right now"
+    return measure(
+        "calibration", CALIBRATION_SIZE, _calibration_workload, repeat=repeat
+    ).ops_per_sec
+
+
+def run_benchmarks(sizes: list[int], repeat: int = 3) -> list[BenchmarkResult]:
+    results: list[BenchmarkResult] = []
+    for size in sizes:
+        # Calibrate right before the cases so both run in the same conditions
+        reference = calibrate(repeat)
+        first = len(results)
+        entries = generate_entries(size)
+        results.append(
+            measure(
+                "Image.from_github_entry",
+                size,
+                lambda: [Image.from_github_entry(entry) for entry in entries],
+                repeat=repeat,
+            )
+        )
+        images = [Image.from_github_entry(entry) for entry in entries]
+        del entries
+        for policy_name, policy in benchmark_policies().items():
+            results.append(
+                measure(
+                    f"matches_retention_policy:{policy_name}",
+                    size,
+                    lambda: [matches_retention_policy(img, policy) for img in images],
+                    repeat=repeat,
+                )
+            )
+            work: list[Image] = []
+
+            def shuffle():
+                work[:] = images
+                random.Random(size).shuffle(work)
+
+            results.append(
+                measure(
+                    f"apply_retention_policy:{policy_name}",
+                    size,
+                    lambda: apply_retention_policy(policy, work),
+                    setup=shuffle,
+                    repeat=repeat,
+                )
+            )
+            results.append(
+                measure(
+                    f"VersionIndex.apply:{policy_name}",
+                    size,
+                    lambda: VersionIndex(work).apply(policy),
+                    setup=shuffle,
+                    repeat=repeat,
+                )
+            )
+        for result in results[first:]:
+            result.relative_speed = result.ops_per_sec / reference
+    return results
+
+
+def load_baseline(path: Path) -> dict[str, dict[str, float]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, results: list[BenchmarkResult]) -> None:
+    baseline = load_baseline(path)
+    for result in results:
+        baseline[result.key] = {
+            "relative_speed": round(result.relative_speed, 4),
+            "peak_bytes": result.peak_bytes,
+        }
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+def find_regressions(
+    results: list[BenchmarkResult],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float = DEFAULT_TOLERANCE,
+    memory_tolerance: float = DEFAULT_MEMORY_TOLERANCE,
+    check_throughput: bool = False,
+) -> list[str]:
+    """
+    Compare results to the baseline and describe every case that uses more
+    memory than `memory_tolerance` allows. With `check_throughput` also every
+    case whose speed relative to the calibration workload dropped by more
+    than `tolerance`. Cases without a baseline entry are ignored.
+    """
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.key)
+        if not expected:
+            continue
+        min_speed = expected["relative_speed"] * (1 - tolerance)
+        max_peak = expected["peak_bytes"] * (1 + memory_tolerance)
+        if check_throughput and result.relative_speed < min_speed:
+            regressions.append(
+                f"{result.key}: relative speed {result.relative_speed:.3f}x is below {min_speed:.3f}x"
+            )
+        if result.peak_bytes > max_peak:
+            regressions.append(
+                f"{result.key}: peak memory {result.peak_bytes:,} B is above {max_peak:,.0f} B"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the retention engine.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument(
+        "--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE
+    )
+    parser.add_argument("--check-throughput", action="store_true")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, repeat=args.repeat)
+    for result in results:
+        print(result)
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = find_regressions(
+        results,
+        load_baseline(args.baseline),
+        args.tolerance,
+        args.memory_tolerance,
+        args.check_throughput,
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Running the async entrypoints: optional uvloop event loop and monitoring of
+the event loop lag, to tell whether a slow run waits on the network or on
+blocking work in our own loop.
+"""
+
+import asyncio
+import logging
+import math
+import os
+from typing import Callable, Coroutine, Literal
+
+from pydantic import BaseModel
+
+
+def get_runtime_args_from_env() -> dict[str, str | None]:
+    return {
+        "event_loop": os.environ.get("EVENT_LOOP"),
+        "monitor_loop_lag": os.environ.get("MONITOR_LOOP_LAG"),
+    }
+
+
+class RuntimeArgs(BaseModel):
+    "How to run the event loop, unset values keep the defaults"
+    event_loop: Literal["asyncio", "uvloop"] = "asyncio"
+    monitor_loop_lag: bool = False
+
+    @classmethod
+    def from_env(cls) -> "RuntimeArgs":
+        return cls(**{k: v for k, v in get_runtime_args_from_env().items() if v})  # type: ignore
+
+
+class LoopLag(BaseModel):
+    "Summary of the sampled scheduling delays in seconds"
+    samples: int
+    max: float
+    p99: float
+    mean: float
+
+    def __str__(self) -> str:
+        return (
+            f"Event loop lag over {self.samples} samples: max {self.max * 1000:.1f}ms,"
+            f" p99 {self.p99 * 1000:.1f}ms, mean {self.mean * 1000:.1f}ms"
+        )
+
+
+class LoopLagMonitor:
+    """
+    Measures how late a sleeping task is woken up by the event loop.
+    Blocking calls and too many ready callbacks show up as lag.
+
+        async with LoopLagMonitor() as monitor:
+            ...
+        print(monitor.summary())
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(loop.time() - start - self.interval, 0.0))
+
+    async def __aenter__(self) -> "LoopLagMonitor":
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def summary(self) -> LoopLag:
+        if not self.lags:
+            return LoopLag(samples=0, max=0, p99=0, mean=0)
+        lags = sorted(self.lags)
+        return LoopLag(
+            samples=len(lags),
+            max=lags[-1],
+            p99=lags[math.ceil(0.99 * len(lags)) - 1],
+            mean=sum(lags) / len(lags),
+        )
+
+
+def get_loop_factory(
+    event_loop: str,
+) -> Callable[[], asyncio.AbstractEventLoop] | None:
+    "Event loop factory for asyncio.Runner, None means the default asyncio loop"
+    if event_loop == "uvloop":
+        try:
+            import uvloop  # type: ignore
+        except ImportError:
+            logging.warning("uvloop is not installed, falling back to asyncio")
+            return None
+        return uvloop.new_event_loop
+    return None
+
+
+async def monitored(coro: Coroutine) -> object:
+    monitor = LoopLagMonitor()
+    try:
+        async with monitor:
+            return await coro
+    finally:
+        logging.info("%s", monitor.summary())
+
+
+def run(coro: Coroutine, runtime_args: RuntimeArgs) -> object:
+    if runtime_args.monitor_loop_lag:
+        coro = monitored(coro)
+    with asyncio.Runner(
+        loop_factory=get_loop_factory(runtime_args.event_loop)
+    ) as runner:
+        return runner.run(coro)
@@ -2,12 +2,13 @@ import asyncio
 import functools
 import logging
 import os
+from base64 import b64encode
 from datetime import datetime
 from typing import Annotated
 from urllib.parse import quote
 
 import aiohttp
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class Image(BaseModel):
@@ -59,8 +60,101 @@ def encode_image(image_name: str) -> str:
     return quote(image_name, safe="")
 
 
+MANIFEST_MEDIA_TYPES = ", ".join(
+    [
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.oci.image.manifest.v1+json",
+        "application/vnd.docker.distribution.manifest.list.v2+json",
+        "application/vnd.docker.distribution.manifest.v2+json",
+    ]
+)
+
+
+def blob_sizes_from_manifest(manifest: dict) -> dict[str, int]:
+    """Sizes of the config and layer blobs of an image manifest by digest."""
+    descriptors = [manifest.get("config"), *manifest.get("layers", [])]
+    return {d["digest"]: d["size"] for d in descriptors if d}
+
+
+def get_connection_settings_from_env() -> dict[str, str | None]:
+    return {
+        "limit": os.environ.get("POOL_SIZE"),
+        "limit_per_host": os.environ.get("POOL_SIZE_PER_HOST"),
+        "keepalive_timeout": os.environ.get("KEEPALIVE_TIMEOUT"),
+        "ttl_dns_cache": os.environ.get("DNS_CACHE_TTL"),
+        "total_timeout": os.environ.get("TOTAL_TIMEOUT"),
+        "connect_timeout": os.environ.get("CONNECT_TIMEOUT"),
+        "read_timeout": os.environ.get("READ_TIMEOUT"),
+    }
+
+
+class ConnectionSettings(BaseModel):
+    """
+    Connection pool and timeout settings for the session created by GithubAPI.
+    A limit of 0 means unlimited, a `ttl_dns_cache` of None caches forever.
+    `connect_timeout` includes waiting for a free connection in the pool,
+    `read_timeout` is the maximum time between two reads from the socket.
+    `total_timeout` caps every request as a whole, 0 disables it.
+    """
+
+    limit: Annotated[int, Field(ge=0)] = 100
+    limit_per_host: Annotated[int, Field(ge=0)] = 0
+    keepalive_timeout: Annotated[float, Field(ge=0)] = 15
+    ttl_dns_cache: Annotated[int, Field(ge=0)] | None = 10
+    total_timeout: Annotated[float, Field(gt=0)] | None = 5
+    connect_timeout: Annotated[float, Field(gt=0)] | None = None
+    read_timeout: Annotated[float, Field(gt=0)] | None = None
+
+    @classmethod
+    def from_env(cls) -> "ConnectionSettings":
+        "Unset values keep the defaults"
+        return cls(**{k: v for k, v in get_connection_settings_from_env().items() if v})  # type: ignore
+
+    @field_validator("total_timeout", mode="before")
+    @classmethod
+    def disable_total_timeout(cls, v: str | float | None) -> str | float | None:
+        return None if v is not None and float(v) == 0 else v
+
+    @model_validator(mode="after")
+    def check_total_timeout(self) -> "ConnectionSettings":
+        if self.total_timeout is not None:
+            for name in ("connect_timeout", "read_timeout"):
+                value = getattr(self, name)
+                if value is not None and value > self.total_timeout:
+                    raise ValueError(
+                        f"`{name}` of {value}s is capped by `total_timeout` of"
+                        f" {self.total_timeout}s, raise or disable `total_timeout`."
+                    )
+        return self
+
+    def connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache,
+        )
+
+    def timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=self.total_timeout,
+            connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+
+
 class GithubAPI:
-    "Interact with images"
+    """
+    Interact with images.
+    Use it as an async context manager so the session is closed again:
+
+        async with GithubAPI(owner="me") as api:
+            await api.get_versions("image")
+
+    Pass `session` to share one connection pool between several instances,
+    it is then left open and has to be closed by the caller. Otherwise a
+    session is created on first use according to `connection_settings`.
+    """
 
     def __init__(
         self,
@@ -68,6 +162,9 @@ class GithubAPI:
         token: str | None = None,
         api_url: str = "https://api.github.com",
         is_user: bool | None = None,
+        session: aiohttp.ClientSession | None = None,
+        connection_settings: ConnectionSettings | None = None,
+        registry_url: str = "https://ghcr.io",
     ):
         token = token or os.environ.get("GH_TOKEN")
         if not token:
@@ -75,14 +172,41 @@ class GithubAPI:
         self.token: str = token
         self.owner: str = owner
         self.api_url: str = api_url
-        self.session = aiohttp.ClientSession(
-            headers={
-                "Authorization": f"token {token}",
-                "X-GitHub-Api-Version": "2022-11-28",
-            },
-            timeout=aiohttp.ClientTimeout(total=5),
+        # sent per request so a shared session can serve different tokens
+        self.headers: dict[str, str] = {
+            "Authorization": f"token {token}",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        self.connection_settings: ConnectionSettings = (
+            connection_settings or ConnectionSettings()
         )
+        self._session: aiohttp.ClientSession | None = session
+        self._owns_session: bool = session is None
         self.is_user: bool | None = is_user
+        self.registry_url: str = registry_url
+        self._registry_tokens: dict[str, str | None] = {}
+        self._registry_token_lock = asyncio.Lock()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=self.connection_settings.connector(),
+                timeout=self.connection_settings.timeout(),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        "Close the session unless it was passed in"
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "GithubAPI":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
 
     @staticmethod
     def ensure_user_checked(method):
@@ -101,7 +225,9 @@ class GithubAPI:
     async def check_is_user(self):
         "Check if owner is org or user"
         if self.is_user is None:
-            async with self.session.get(f"{self.api_url}/users/{self.owner}") as resp:
+            async with self.session.get(
+                f"{self.api_url}/users/{self.owner}", headers=self.headers
+            ) as resp:
                 assert (
                     resp.status == 200
                 ), f"Unable to get user info for {self.owner}. Is the token valid?"
@@ -115,7 +241,7 @@ class GithubAPI:
         images: list[Image] = []
         next_url: str | None = url
         while next_url:
-            async with self.session.get(next_url) as response:
+            async with self.session.get(next_url, headers=self.headers) as response:
                 if response.status != 200:
                     logging.warning(
                         "Failed to fetch versions for %s. Status: %s, Response: %s",
@@ -165,7 +291,7 @@ class GithubAPI:
         "Delete an image"
         if not image.url:
             logging.info("Could not delete image as it does not have an url: %s", image)
-        async with self.session.delete(image.url) as resp:  # type: ignore
+        async with self.session.delete(image.url, headers=self.headers) as resp:  # type: ignore
             if resp.status == 204:
                 return True
             logging.error(
@@ -181,3 +307,83 @@ class GithubAPI:
         "Delete all images"
         # TODO This probably needs to be throttled
         return await asyncio.gather(*[self.delete_image(image) for image in images])
+
+    def registry_repository(self, image_name: str) -> str:
+        return f"{self.owner}/{image_name}".lower()
+
+    async def get_registry_token(self, image_name: str) -> str | None:
+        "Exchange the token for a pull token of the container registry"
+        repository = self.registry_repository(image_name)
+        basic_auth = b64encode(f"{self.owner}:{self.token}".encode()).decode()
+        async with self._registry_token_lock:
+            if repository not in self._registry_tokens:
+                async with self.session.get(
+                    f"{self.registry_url}/token",
+                    params={"scope": f"repository:{repository}:pull"},
+                    headers={"Authorization": f"Basic {basic_auth}"},
+                ) as resp:
+                    token = None
+                    if resp.status == 200:
+                        try:
+                            body = await resp.json(content_type=None)
+                        except ValueError:
+                            body = None
+                        if isinstance(body, dict):
+                            token = body.get("token")
+                    if not token:
+                        logging.error(
+                            "Unable to get a registry token for %s with status %s",
+                            repository,
+                            resp.status,
+                        )
+                    self._registry_tokens[repository] = token
+        return self._registry_tokens[repository]
+
+    async def get_manifest(self, image_name: str, reference: str) -> dict | None:
+        "Get a manifest or image index from the container registry"
+        token = await self.get_registry_token(image_name)
+        if not token:
+            return None
+        url = f"{self.registry_url}/v2/{self.registry_repository(image_name)}/manifests/{reference}"
+        try:
+            async with self.session.get(
+                url,
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Accept": MANIFEST_MEDIA_TYPES,
+                },
+            ) as resp:
+                if resp.status != 200:
+                    logging.warning(
+                        "Unable to get manifest %s with status %s", url, resp.status
+                    )
+                    return None
+                return await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logging.warning("Unable to get manifest %s: %r", url, e)
+            return None
+
+    async def get_blob_sizes(
+        self, image_name: str, digest: str
+    ) -> dict[str, int] | None:
+        """
+        Sizes of all blobs referenced by a version by digest.
+        For multi-arch images the blobs of all platforms are included.
+        Returns None if any manifest could not be fetched.
+        """
+        manifest = await self.get_manifest(image_name, digest)
+        if manifest is None:
+            return None
+        if "manifests" not in manifest:
+            return blob_sizes_from_manifest(manifest)
+        blobs: dict[str, int] = {}
+        for child in await asyncio.gather(
+            *[
+                self.get_blob_sizes(image_name, m["digest"])
+                for m in manifest["manifests"]
+            ]
+        ):
+            if child is None:
+                return None
+            blobs.update(child)
+        return blobs
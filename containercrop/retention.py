@@ -5,14 +5,20 @@ and keep only the images you need.
 
 import logging
 import os
+import re
+from array import array
+from bisect import bisect_left
 from datetime import datetime
-from fnmatch import fnmatch
+from fnmatch import fnmatch, translate
+from itertools import accumulate, compress
+from pathlib import Path
 from typing import Annotated
 
 from dateparser import parse
 from pydantic import BaseModel, Field, field_validator, model_validator
 
-from containercrop.github_api import GithubAPI, Image
+from containercrop import storage
+from containercrop.github_api import ConnectionSettings, GithubAPI, Image
 
 
 def get_args_from_env() -> dict[str, str | None]:
@@ -26,6 +32,9 @@ def get_args_from_env() -> dict[str, str | None]:
         "filter_tags": os.environ.get("FILTER_TAGS"),
         "dry_run": os.environ.get("DRY_RUN"),
         "repo_owner": os.environ.get("REPO_OWNER"),
+        "simulate": os.environ.get("SIMULATE"),
+        "max_total_size": os.environ.get("MAX_TOTAL_SIZE"),
+        "size_cache": os.environ.get("SIZE_CACHE"),
     }
 
 
@@ -40,6 +49,9 @@ class RetentionArgs(BaseModel):
     filter_tags: list[str] = Field(default_factory=list)
     dry_run: bool = False
     repo_owner: str
+    simulate: bool = False
+    max_total_size: Annotated[int, Field(gt=0)] | None = None
+    size_cache: Path = storage.DEFAULT_SIZE_CACHE
 
     @classmethod
     def from_env(cls) -> "RetentionArgs":
@@ -57,6 +69,18 @@ class RetentionArgs(BaseModel):
     def get_comma_splits(inp: str) -> list[str]:
         return [sub.strip() for sub in inp.split(",")] if inp else []
 
+    @field_validator("max_total_size", mode="before")
+    @classmethod
+    def parse_size(cls, v: str | int | None) -> int | None:
+        if isinstance(v, str):
+            return storage.parse_size(v) if v.strip() else None
+        return v
+
+    @field_validator("size_cache", mode="before")
+    @classmethod
+    def default_size_cache(cls, v: str | Path | None) -> Path:
+        return Path(v).expanduser() if v else storage.DEFAULT_SIZE_CACHE
+
     @field_validator("cut_off", mode="before")
     @classmethod
     def parse_human_readable_datetime(cls, v: str) -> datetime:
@@ -126,23 +150,162 @@ def apply_retention_policy(args: RetentionArgs, images: list[Image]) -> list[Ima
     return matches[args.keep_at_least :]
 
 
-async def main(retention_args: RetentionArgs):
-    api = GithubAPI(owner=retention_args.repo_owner, token=retention_args.token)
-    images = await api.get_versions(retention_args.image_name)
-    to_delete = apply_retention_policy(retention_args, images)
-    if not retention_args.dry_run:
-        logging.info("Will delete %s images", len(to_delete))
-        logging.info(
-            "Images to delete: \n\t%s", "\n\t".join(str(img) for img in to_delete)
-        )
-        await api.delete_images(to_delete)
-        logging.info(
-            "If you deleted images you want to keep don't panic you have 30 days to recoer them. You can check out https://docs.github.com/en/packages/learn-github-packages/deleting-and-restoring-a-package#restoring-packages"
-        )
-    else:
-        logging.info("Would delete %s images but dry_run is enabled", len(to_delete))
-        logging.info(
-            "Images that would be deleted: \n\t%s",
-            "\n\t".join(str(img) for img in to_delete),
+def compile_patterns(patterns: list[str]) -> re.Pattern:
+    "Single regex equivalent to matching any of the patterns with `fnmatch`"
+    return re.compile("|".join(translate(os.path.normcase(p)) for p in patterns))
+
+
+def as_int(mask: bytearray) -> int:
+    return int.from_bytes(mask, "little")
+
+
+class VersionIndex:
+    """
+    Columnar view of a version listing for evaluating retention policies on
+    very large listings. Produces exactly the same result as
+    `apply_retention_policy` but:
+    - versions are sorted by `updated_at` once, newest first, and the cut-off
+      is found with a binary search
+    - tag patterns are matched once per unique tag and cached as masks
+    - `keep_at_least` is a slice over the eligible versions
+    """
+
+    def __init__(self, images: list[Image]):
+        self.images: list[Image] = sorted(
+            images, key=lambda x: x.updated_at, reverse=True
         )
-    logging.info("Done")
+        # oldest first so it can be bisected
+        self.updated_ascending: list[datetime] = [
+            image.updated_at for image in reversed(self.images)
+        ]
+
+        tag_ids: dict[str, int] = {}
+        self.image_tags: list[tuple[int, ...]] = [
+            tuple(tag_ids.setdefault(tag, len(tag_ids)) for tag in image.tags)
+            for image in self.images
+        ]
+        self.tags: list[str] = list(tag_ids)
+        self.tagged = bytearray(bool(tags) for tags in self.image_tags)
+        self._tag_masks: dict[tuple[str, ...], bytearray] = {}
+        self._image_masks: dict[tuple[str, ...], bytearray] = {}
+        self._eligible: dict[tuple, bytearray] = {}
+        self._eligible_counts: dict[tuple, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def tag_mask(self, patterns: list[str]) -> bytearray:
+        "For every unique tag whether it matches any of the patterns"
+        key = tuple(patterns)
+        if key not in self._tag_masks:
+            match = compile_patterns(patterns).match
+            self._tag_masks[key] = bytearray(
+                match(os.path.normcase(tag)) is not None for tag in self.tags
+            )
+        return self._tag_masks[key]
+
+    def image_mask(self, patterns: list[str]) -> bytearray:
+        "For every version whether any of its tags matches any of the patterns"
+        key = tuple(patterns)
+        if key not in self._image_masks:
+            tag_mask = self.tag_mask(patterns)
+            self._image_masks[key] = bytearray(
+                any(map(tag_mask.__getitem__, tags)) for tags in self.image_tags
+            )
+        return self._image_masks[key]
+
+    @staticmethod
+    def _tag_policy(args: RetentionArgs) -> tuple:
+        return (tuple(args.skip_tags), args.untagged_only, tuple(args.filter_tags))
+
+    def eligible(self, args: RetentionArgs) -> bytearray:
+        "For every version whether the tag related parts of the policy allow deleting it"
+        key = self._tag_policy(args)
+        if key not in self._eligible:
+            # masks hold 0/1 bytes, so they can be combined as big integers
+            everything = int.from_bytes(b"\x01" * len(self.images), "little")
+            mask = everything
+            if args.skip_tags:
+                mask &= everything ^ as_int(self.image_mask(args.skip_tags))
+            if args.untagged_only:
+                mask &= everything ^ as_int(self.tagged)
+            if args.filter_tags:
+                mask &= as_int(self.image_mask(args.filter_tags))
+            self._eligible[key] = bytearray(mask.to_bytes(len(self.images), "little"))
+        return self._eligible[key]
+
+    def cut_off_index(self, cut_off: datetime) -> int:
+        "Index of the newest version that is older than the cut-off"
+        return len(self.images) - bisect_left(self.updated_ascending, cut_off)
+
+    def apply(self, args: RetentionArgs) -> list[Image]:
+        "Return the versions that should be deleted, oldest last"
+        start = self.cut_off_index(args.cut_off)
+        eligible = self.eligible(args)
+        matches = list(compress(self.images[start:], eligible[start:]))
+        return matches[args.keep_at_least :]
+
+    def deletable(self, args: RetentionArgs) -> list[Image]:
+        "Versions the tag policy allows deleting regardless of age, newest first"
+        return list(compress(self.images, self.eligible(args)))[args.keep_at_least :]
+
+    def count(self, args: RetentionArgs) -> int:
+        """
+        Number of versions `apply` would return, without building the list.
+        Uses cached prefix sums so evaluating many policies that share the
+        same tag patterns only costs a binary search each.
+        """
+        key = self._tag_policy(args)
+        if key not in self._eligible_counts:
+            self._eligible_counts[key] = array(
+                "q", accumulate(self.eligible(args), initial=0)
+            )
+        counts = self._eligible_counts[key]
+        matches = counts[-1] - counts[self.cut_off_index(args.cut_off)]
+        return max(matches - args.keep_at_least, 0)
+
+
+async def main(
+    retention_args: RetentionArgs,
+    connection_settings: ConnectionSettings | None = None,
+):
+    async with GithubAPI(
+        owner=retention_args.repo_owner,
+        token=retention_args.token,
+        connection_settings=connection_settings,
+    ) as api:
+        images = await api.get_versions(retention_args.image_name)
+        index = VersionIndex(images)
+        to_delete = index.apply(retention_args)
+        if retention_args.max_total_size:
+            blob_sizes = await storage.fetch_blob_sizes(
+                api,
+                retention_args.image_name,
+                index.images,
+                storage.SizeCache(retention_args.size_cache),
+            )
+            to_delete += storage.select_for_budget(
+                index.images,
+                index.deletable(retention_args),
+                to_delete,
+                blob_sizes,
+                retention_args.max_total_size,
+            )
+        if not retention_args.dry_run:
+            logging.info("Will delete %s images", len(to_delete))
+            logging.info(
+                "Images to delete: \n\t%s", "\n\t".join(str(img) for img in to_delete)
+            )
+            await api.delete_images(to_delete)
+            logging.info(
+                "If you deleted images you want to keep don't panic you have 30 days to recoer them. You can check out https://docs.github.com/en/packages/learn-github-packages/deleting-and-restoring-a-package#restoring-packages"
+            )
+        else:
+            logging.info(
+                "Would delete %s images but dry_run is enabled", len(to_delete)
+            )
+            logging.info(
+                "Images that would be deleted: \n\t%s",
+                "\n\t".join(str(img) for img in to_delete),
+            )
+        logging.info("Done")
@@ -0,0 +1,137 @@
+"""
+What-if sweep of retention policies over a single version listing.
+The listing is fetched once and every candidate policy is evaluated against
+the same VersionIndex, so the sort and tag matching are shared.
+"""
+
+import logging
+import os
+from datetime import datetime
+from itertools import product
+from typing import Annotated
+
+from pydantic import BaseModel, Field, field_validator
+
+from containercrop.github_api import ConnectionSettings, GithubAPI
+from containercrop.retention import RetentionArgs, VersionIndex
+
+
+def get_simulation_args_from_env() -> dict[str, str | None]:
+    return {
+        "cut_offs": os.environ.get("SIMULATE_CUT_OFFS"),
+        "keep_at_least": os.environ.get("SIMULATE_KEEP_AT_LEAST"),
+        "skip_tags": os.environ.get("SIMULATE_SKIP_TAGS"),
+        "filter_tags": os.environ.get("SIMULATE_FILTER_TAGS"),
+    }
+
+
+def get_semicolon_splits(inp: str | None) -> list[str]:
+    return [sub.strip() for sub in inp.split(";")] if inp else []
+
+
+class SimulationArgs(BaseModel):
+    """
+    Candidate values to sweep. Every field left empty falls back to the
+    value of the base RetentionArgs.
+    Cut-offs and tag sets are separated by `;` since tag sets themselves are
+    comma separated, e.g. `v*,latest;latest`.
+    """
+
+    cut_offs: list[datetime] = Field(default_factory=list)
+    keep_at_least: list[Annotated[int, Field(ge=0)]] = Field(default_factory=list)
+    skip_tags: list[list[str]] = Field(default_factory=list)
+    filter_tags: list[list[str]] = Field(default_factory=list)
+
+    @classmethod
+    def from_env(cls) -> "SimulationArgs":
+        return cls(**get_simulation_args_from_env())  # type: ignore
+
+    @field_validator("cut_offs", mode="before")
+    @classmethod
+    def parse_cut_offs(cls, v: str | None) -> list[datetime]:
+        return [
+            RetentionArgs.parse_human_readable_datetime(cut_off)
+            for cut_off in get_semicolon_splits(v)
+        ]
+
+    @field_validator("keep_at_least", mode="before")
+    @classmethod
+    def parse_keep_at_least(cls, v: str | None) -> list[str]:
+        return RetentionArgs.get_comma_splits(v or "")
+
+    @field_validator("skip_tags", "filter_tags", mode="before")
+    @classmethod
+    def parse_tag_sets(cls, v: str | None) -> list[list[str]]:
+        return [
+            RetentionArgs.get_comma_splits(tags) for tags in get_semicolon_splits(v)
+        ]
+
+    def candidates(self, base: RetentionArgs) -> list[RetentionArgs]:
+        "Every combination of the candidate values applied on top of `base`"
+        candidates = []
+        for cut_off, keep_at_least, skip_tags, filter_tags in product(
+            self.cut_offs or [base.cut_off],
+            self.keep_at_least or [base.keep_at_least],
+            self.skip_tags or [base.skip_tags],
+            self.filter_tags or [base.filter_tags],
+        ):
+            candidate = base.model_copy(
+                update={
+                    "cut_off": cut_off,
+                    "keep_at_least": keep_at_least,
+                    "skip_tags": skip_tags,
+                    "filter_tags": filter_tags,
+                }
+            )
+            if candidate.untagged_only and candidate.skip_tags:
+                raise ValueError("Cannot set both `untagged_only` and `skip_tags`.")
+            candidates.append(candidate)
+        return candidates
+
+
+def simulate(
+    index: VersionIndex, candidates: list[RetentionArgs]
+) -> list[tuple[RetentionArgs, int]]:
+    "Number of versions each candidate would delete"
+    return [(candidate, index.count(candidate)) for candidate in candidates]
+
+
+def format_table(results: list[tuple[RetentionArgs, int]], total: int) -> str:
+    header = ("cut-off", "keep-at-least", "skip-tags", "filter-tags", "delete", "keep")
+    rows = [header] + [
+        (
+            args.cut_off.isoformat(),
+            str(args.keep_at_least),
+            ",".join(args.skip_tags) or "-",
+            ",".join(args.filter_tags) or "-",
+            str(deleted),
+            str(total - deleted),
+        )
+        for args, deleted in results
+    ]
+    widths = [max(len(row[col]) for row in rows) for col in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
+
+
+async def main(
+    retention_args: RetentionArgs,
+    simulation_args: SimulationArgs,
+    connection_settings: ConnectionSettings | None = None,
+):
+    async with GithubAPI(
+        owner=retention_args.repo_owner,
+        token=retention_args.token,
+        connection_settings=connection_settings,
+    ) as api:
+        images = await api.get_versions(retention_args.image_name)
+    index = VersionIndex(images)
+    candidates = simulation_args.candidates(retention_args)
+    logging.info(
+        "Simulating %s policies against %s versions", len(candidates), len(index)
+    )
+    results = simulate(index, candidates)
+    logging.info("Simulation results:\n%s", format_table(results, len(index)))
+    logging.info("Done")
@@ -0,0 +1,180 @@
+"""
+Storage budget retention: delete the oldest versions until the blobs that
+are still referenced by the remaining versions fit into a size limit.
+Layers shared between versions are counted once.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+import aiohttp
+
+from containercrop.github_api import GithubAPI, Image
+
+DEFAULT_SIZE_CACHE = Path.home() / ".cache" / "containercrop" / "blob-sizes.json"
+MAX_CONCURRENT_MANIFESTS = 20
+
+UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 1000,
+    "mb": 1000**2,
+    "gb": 1000**3,
+    "tb": 1000**4,
+    "kib": 1024,
+    "mib": 1024**2,
+    "gib": 1024**3,
+    "tib": 1024**4,
+}
+
+
+def parse_size(size: str) -> int:
+    "Parse a human readable size like `500MB` or `2 GiB` into bytes"
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", size)
+    if not match or match.group(2).lower() not in UNITS:
+        raise ValueError(f"Unable to parse size '{size}'")
+    return int(float(match.group(1)) * UNITS[match.group(2).lower()])
+
+
+class SizeCache:
+    """
+    Blob sizes per version digest, persisted as JSON.
+    Digests are content addressed, so entries never go stale.
+    """
+
+    def __init__(self, path: Path = DEFAULT_SIZE_CACHE):
+        self.path = path
+        self.entries: dict[str, dict[str, int]] = {}
+        if path.exists():
+            try:
+                entries = json.loads(path.read_text())
+            except (OSError, ValueError):
+                entries = None
+            if isinstance(entries, dict):
+                self.entries = entries
+            else:
+                logging.warning("Ignoring unreadable size cache %s", path)
+
+    def get(self, digest: str) -> dict[str, int] | None:
+        return self.entries.get(digest)
+
+    def set(self, digest: str, blobs: dict[str, int]) -> None:
+        self.entries[digest] = blobs
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries))
+        os.replace(tmp, self.path)
+
+
+async def fetch_blob_sizes(
+    api: GithubAPI, image_name: str, images: list[Image], cache: SizeCache
+) -> dict[str, dict[str, int]]:
+    """
+    Blob sizes for every version by its digest. Versions missing from the
+    cache are fetched concurrently and added to it. Versions whose manifest
+    can not be fetched are left out.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_MANIFESTS)
+
+    async def fetch(digest: str) -> None:
+        try:
+            async with semaphore:
+                blobs = await api.get_blob_sizes(image_name, digest)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning("Unable to get the size of %s: %r", digest, e)
+            return
+        if blobs is not None:
+            cache.set(digest, blobs)
+
+    missing = {image.name for image in images if cache.get(image.name) is None}
+    logging.info("Fetching manifests of %s versions", len(missing))
+    try:
+        await asyncio.gather(*[fetch(digest) for digest in missing])
+    finally:
+        cache.save()
+    blob_sizes = {
+        image.name: blobs
+        for image in images
+        if (blobs := cache.get(image.name)) is not None
+    }
+    unknown = len({image.name for image in images} - blob_sizes.keys())
+    if unknown:
+        logging.warning("Unable to get the size of %s versions", unknown)
+    return blob_sizes
+
+
+def select_for_budget(
+    images: list[Image],
+    candidates: list[Image],
+    to_delete: list[Image],
+    blob_sizes: dict[str, dict[str, int]],
+    max_total_size: int,
+) -> list[Image]:
+    """
+    Pick the fewest of the oldest `candidates` that have to be deleted in
+    addition to `to_delete` so the blobs of the remaining `images` fit into
+    `max_total_size`. A blob only frees space once no remaining version
+    references it.
+    :param images: All versions of the package
+    :param candidates: Versions that may be deleted, newest first
+    :param to_delete: Versions that are deleted anyway
+    :return: The additional versions to delete, oldest first. Empty if the
+        size of any version is unknown, as the total would be understated,
+        or if deleting every candidate still would not reach the budget.
+    """
+    unknown = [image for image in images if image.name not in blob_sizes]
+    if unknown:
+        logging.warning(
+            "Sizes of %s versions are unknown, skipping the storage budget",
+            len(unknown),
+        )
+        return []
+
+    references: Counter[str] = Counter()
+    sizes: dict[str, int] = {}
+    for image in images:
+        references.update(blob_sizes[image.name].keys())
+        sizes.update(blob_sizes[image.name])
+    total = sum(sizes.values())
+
+    def release(image: Image, references: Counter[str]) -> int:
+        freed = 0
+        for digest in blob_sizes[image.name]:
+            references[digest] -= 1
+            if references[digest] == 0:
+                freed += sizes[digest]
+        return freed
+
+    for image in to_delete:
+        total -= release(image, references)
+
+    deleted = {image.id for image in to_delete}
+    candidates = [image for image in candidates if image.id not in deleted]
+
+    remaining = references.copy()
+    smallest = total - sum(release(image, remaining) for image in candidates)
+    if smallest > max_total_size:
+        logging.warning(
+            "Package would still use %s bytes after deleting all %s eligible versions,"
+            " the limit of %s bytes can not be reached so none are deleted for it",
+            smallest,
+            len(candidates),
+            max_total_size,
+        )
+        return []
+
+    selected = []
+    for image in reversed(candidates):
+        if total <= max_total_size:
+            break
+        total -= release(image, references)
+        selected.append(image)
+    logging.info("Package will use %s of %s bytes", total, max_total_size)
+    return selected
@@ -0,0 +1,41 @@
+from containercrop import benchmark
+from containercrop.github_api import Image
+
+
+def test_generate_entries_is_deterministic_and_parseable():
+    entries = benchmark.generate_entries(500, seed=1)
+    assert entries == benchmark.generate_entries(500, seed=1)
+    images = [Image.from_github_entry(entry) for entry in entries]
+    assert len(images) == 500
+    assert any(not img.tags for img in images)
+    assert any("latest" in img.tags for img in images)
+    assert any(tag.startswith("v") for img in images for tag in img.tags)
+
+
+def test_run_benchmarks_reports_every_case():
+    results = benchmark.run_benchmarks([200], repeat=1)
+    names = {result.name for result in results}
+    assert "Image.from_github_entry" in names
+    assert "apply_retention_policy:wildcards" in names
+    assert all(result.ops_per_sec > 0 for result in results)
+    assert all(result.peak_bytes > 0 for result in results)
+    assert all(result.relative_speed > 0 for result in results)
+
+
+def test_find_regressions():
+    result = benchmark.BenchmarkResult(
+        name="case", size=10, ops_per_sec=100, peak_bytes=1000, relative_speed=2
+    )
+    baseline = {"case[10]": {"relative_speed": 2, "peak_bytes": 1000}}
+    assert benchmark.find_regressions([result], baseline) == []
+    assert benchmark.find_regressions([result], {}) == []
+
+    slower = result.model_copy(update={"ops_per_sec": 40, "relative_speed": 0.8})
+    assert benchmark.find_regressions([slower], baseline) == []
+    assert (
+        len(benchmark.find_regressions([slower], baseline, check_throughput=True)) == 1
+    )
+
+    fatter = result.model_copy(update={"peak_bytes": 1200})
+    assert len(benchmark.find_regressions([fatter], baseline)) == 1
+    assert benchmark.find_regressions([fatter], baseline, memory_tolerance=0.5) == []
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+from containercrop import event_loop
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_detects_blocking_calls():
+    async with event_loop.LoopLagMonitor(interval=0.01) as monitor:
+        await asyncio.sleep(0.05)
+        time.sleep(0.1)  # blocks the loop
+        await asyncio.sleep(0.05)
+    summary = monitor.summary()
+    assert summary.samples > 1
+    assert summary.max >= 0.05
+    assert summary.p99 <= summary.max
+    assert monitor._task.done()
+
+
+def test_loop_lag_summary_without_samples():
+    summary = event_loop.LoopLagMonitor().summary()
+    assert summary.samples == 0
+    assert summary.max == 0
+
+
+def test_RuntimeArgs_from_env(monkeypatch):
+    monkeypatch.setenv("EVENT_LOOP", "")
+    monkeypatch.delenv("MONITOR_LOOP_LAG", raising=False)
+    assert event_loop.RuntimeArgs.from_env() == event_loop.RuntimeArgs()
+
+    monkeypatch.setenv("EVENT_LOOP", "uvloop")
+    monkeypatch.setenv("MONITOR_LOOP_LAG", "true")
+    args = event_loop.RuntimeArgs.from_env()
+    assert args.event_loop == "uvloop"
+    assert args.monitor_loop_lag
+
+    monkeypatch.setenv("EVENT_LOOP", "trio")
+    with pytest.raises(ValueError):
+        event_loop.RuntimeArgs.from_env()
+
+
+def test_run_with_monitor_returns_result():
+    async def work():
+        await asyncio.sleep(0.01)
+        return 42
+
+    args = event_loop.RuntimeArgs(event_loop="uvloop", monitor_loop_lag=True)
+    assert event_loop.run(work(), args) == 42
+
+
+def test_run_with_monitor_logs_lag_when_failing(caplog):
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise TimeoutError
+
+    caplog.set_level("INFO")
+    with pytest.raises(TimeoutError):
+        event_loop.run(fail(), event_loop.RuntimeArgs(monitor_loop_lag=True))
+    assert "Event loop lag over" in caplog.text
@@ -1,7 +1,11 @@
+import asyncio
 from datetime import datetime, timedelta
 from pprint import pprint
 
+import aiohttp
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 
 from containercrop import github_api
 
@@ -94,3 +98,159 @@ def test_various_link_header_formats():
 def test_encode_image():
     name = "asdf/asdf"
     assert github_api.encode_image(name) == "asdf%2Fasdf"
+
+
+@pytest.mark.asyncio
+async def test_github_api_closes_its_session():
+    settings = github_api.ConnectionSettings(
+        limit=10, limit_per_host=5, connect_timeout=1, read_timeout=2
+    )
+    async with github_api.GithubAPI(
+        owner="test", token="dummy", connection_settings=settings
+    ) as api:
+        session = api.session
+        assert api.session is session
+        assert session.connector.limit == 10
+        assert session.connector.limit_per_host == 5
+        assert session.timeout.connect == 1
+        assert session.timeout.sock_read == 2
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_github_api_leaves_shared_session_open():
+    async with aiohttp.ClientSession() as session:
+        async with github_api.GithubAPI(
+            owner="a", token="dummy", session=session
+        ) as first:
+            assert first.session is session
+        async with github_api.GithubAPI(
+            owner="b", token="other", session=session
+        ) as second:
+            assert second.session is session
+            assert second.headers["Authorization"] == "token other"
+        assert not session.closed
+
+
+@pytest.mark.asyncio
+async def test_github_api_does_not_create_unused_session():
+    async with github_api.GithubAPI(owner="test", token="dummy") as api:
+        pass
+    assert api._session is None
+
+
+def test_blob_sizes_from_manifest():
+    manifest = {
+        "schemaVersion": 2,
+        "config": {"digest": "sha256:config", "size": 1},
+        "layers": [
+            {"digest": "sha256:a", "size": 10},
+            {"digest": "sha256:b", "size": 20},
+        ],
+    }
+    assert github_api.blob_sizes_from_manifest(manifest) == {
+        "sha256:config": 1,
+        "sha256:a": 10,
+        "sha256:b": 20,
+    }
+    assert github_api.blob_sizes_from_manifest({"schemaVersion": 2}) == {}
+
+
+@pytest.mark.asyncio
+async def test_get_blob_sizes_of_multi_arch_image():
+    manifests = {
+        "sha256:index": {
+            "manifests": [{"digest": "sha256:amd64"}, {"digest": "sha256:arm64"}]
+        },
+        "sha256:amd64": {
+            "config": {"digest": "sha256:c1", "size": 1},
+            "layers": [{"digest": "sha256:shared", "size": 100}],
+        },
+        "sha256:arm64": {
+            "config": {"digest": "sha256:c2", "size": 2},
+            "layers": [{"digest": "sha256:shared", "size": 100}],
+        },
+    }
+    token_requests = []
+
+    async def token(request):
+        token_requests.append(request.query["scope"])
+        return web.json_response({"token": "pull-token"})
+
+    async def manifest(request):
+        assert request.headers["Authorization"] == "Bearer pull-token"
+        assert request.match_info["repository"] == "owner/repo/image"
+        if request.match_info["reference"] not in manifests:
+            return web.Response(status=404)
+        return web.json_response(manifests[request.match_info["reference"]])
+
+    app = web.Application()
+    app.router.add_get("/token", token)
+    app.router.add_get("/v2/{repository:.+}/manifests/{reference}", manifest)
+    async with TestServer(app) as server:
+        async with github_api.GithubAPI(
+            owner="Owner", token="dummy", registry_url=str(server.make_url(""))
+        ) as api:
+            assert await api.get_blob_sizes("repo/image", "sha256:index") == {
+                "sha256:c1": 1,
+                "sha256:c2": 2,
+                "sha256:shared": 100,
+            }
+            assert await api.get_blob_sizes("repo/image", "sha256:gone") is None
+    assert token_requests == ["repository:owner/repo/image:pull"]
+
+
+def test_ConnectionSettings_from_env(monkeypatch):
+    for name in github_api.get_connection_settings_from_env():
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("POOL_SIZE", "")
+    assert github_api.ConnectionSettings.from_env() == github_api.ConnectionSettings()
+
+    monkeypatch.setenv("POOL_SIZE", "200")
+    monkeypatch.setenv("POOL_SIZE_PER_HOST", "50")
+    monkeypatch.setenv("KEEPALIVE_TIMEOUT", "60")
+    monkeypatch.setenv("DNS_CACHE_TTL", "300")
+    monkeypatch.setenv("TOTAL_TIMEOUT", "0")
+    monkeypatch.setenv("CONNECT_TIMEOUT", "10")
+    monkeypatch.setenv("READ_TIMEOUT", "30")
+    settings = github_api.ConnectionSettings.from_env()
+    assert settings.limit == 200
+    assert settings.limit_per_host == 50
+    assert settings.keepalive_timeout == 60
+    assert settings.ttl_dns_cache == 300
+    assert settings.total_timeout is None
+    assert settings.connect_timeout == 10
+    assert settings.read_timeout == 30
+
+
+def test_ConnectionSettings_rejects_timeouts_capped_by_total():
+    with pytest.raises(ValueError):
+        github_api.ConnectionSettings(read_timeout=30)
+    with pytest.raises(ValueError):
+        github_api.ConnectionSettings(total_timeout=10, connect_timeout=20)
+    github_api.ConnectionSettings(total_timeout=60, read_timeout=30)
+
+
+@pytest.mark.asyncio
+async def test_get_blob_sizes_handles_bad_token_and_timeouts():
+    async def token(request):
+        if "broken" in request.query["scope"]:
+            return web.json_response({"error": "denied"})
+        return web.json_response({"token": "pull-token"})
+
+    async def manifest(request):
+        await asyncio.sleep(1)
+        return web.json_response({"layers": []})
+
+    app = web.Application()
+    app.router.add_get("/token", token)
+    app.router.add_get("/v2/{repository:.+}/manifests/{reference}", manifest)
+    async with TestServer(app) as server:
+        async with github_api.GithubAPI(
+            owner="owner",
+            token="dummy",
+            registry_url=str(server.make_url("")),
+            connection_settings=github_api.ConnectionSettings(total_timeout=0.1),
+        ) as api:
+            assert await api.get_blob_sizes("broken", "sha256:a") is None
+            assert await api.get_blob_sizes("slow", "sha256:a") is None
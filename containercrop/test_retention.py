@@ -2,8 +2,9 @@ from datetime import datetime, timedelta, timezone
 
 import pytest
 
+from containercrop.benchmark import generate_images as generate_listing
 from containercrop.github_api import Image
-from containercrop.retention import RetentionArgs, apply_retention_policy
+from containercrop.retention import RetentionArgs, VersionIndex, apply_retention_policy
 
 
 @pytest.fixture
@@ -381,3 +382,64 @@ def test_image_processing_enforces_date_order(generate_images):
     )  # "beta" and possibly "latest" if not matching skip_tags wildcard
     assert retained_images[0].tags == ["v1.2"]
     assert retained_images[1].tags == ["v1.1"]
+
+
+@pytest.mark.parametrize(
+    "policy",
+    [
+        {"cut_off": "2024-01-01 UTC", "skip_tags": ""},
+        {"cut_off": "2023-10-01 UTC", "skip_tags": "", "keep_at_least": 25},
+        {"cut_off": "2024-03-01 UTC", "skip_tags": "", "untagged_only": True},
+        {"cut_off": "2024-02-01 UTC", "skip_tags": "latest,v*.*.*,*-rc*"},
+        {
+            "cut_off": "2024-02-01 UTC",
+            "skip_tags": "v*.*",
+            "filter_tags": "sha-*,pr-1*,v1*",
+            "keep_at_least": 7,
+        },
+        {"cut_off": "2020-01-01 UTC", "skip_tags": ""},
+        {"cut_off": "2030-01-01 UTC", "skip_tags": "", "keep_at_least": 100000},
+    ],
+)
+def test_version_index_matches_per_image_path(policy):
+    images = generate_listing(3000, seed=42)
+    args = RetentionArgs(image_name="test", repo_owner="test", **policy)
+    expected = apply_retention_policy(args, list(images))
+    assert VersionIndex(images).apply(args) == expected
+
+
+def test_version_index_keeps_order_of_equal_timestamps(generate_images):
+    images = generate_images(
+        tags_list=[["v1"], [], ["v2"], [], ["latest"]],
+        days_old_list=[10],
+        names_list=["image1"],
+    )
+    for image in images:
+        image.updated_at = images[0].updated_at
+    policy = RetentionArgs(
+        image_name="image1",
+        cut_off="5 days ago UTC",
+        skip_tags="latest",
+        keep_at_least=1,
+        repo_owner="test",
+    )
+    expected = apply_retention_policy(policy, list(images))
+    assert [img.id for img in VersionIndex(images).apply(policy)] == [
+        img.id for img in expected
+    ]
+
+
+def test_version_index_cut_off_is_exclusive():
+    cut_off = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    images = [
+        Image(id=0, updated_at=cut_off),
+        Image(id=1, updated_at=cut_off - timedelta(microseconds=1)),
+        Image(id=2, updated_at=cut_off + timedelta(microseconds=1)),
+    ]
+    policy = RetentionArgs(
+        image_name="test",
+        cut_off=cut_off.isoformat(),
+        skip_tags="",
+        repo_owner="test",
+    )
+    assert [img.id for img in VersionIndex(images).apply(policy)] == [1]
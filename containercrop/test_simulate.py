@@ -0,0 +1,80 @@
+import pytest
+
+from containercrop.benchmark import generate_images
+from containercrop.retention import RetentionArgs, VersionIndex
+from containercrop.simulate import SimulationArgs, format_table, simulate
+
+
+@pytest.fixture
+def base_policy():
+    return RetentionArgs(
+        image_name="test",
+        cut_off="2024-01-01 UTC",
+        skip_tags="latest",
+        keep_at_least=5,
+        repo_owner="test",
+    )
+
+
+def test_SimulationArgs_parsing():
+    args = SimulationArgs(
+        cut_offs="2024-01-01 UTC; 30 days ago UTC",
+        keep_at_least="0, 10",
+        skip_tags="latest,v*;",
+        filter_tags="",
+    )
+    assert len(args.cut_offs) == 2
+    assert args.keep_at_least == [0, 10]
+    assert args.skip_tags == [["latest", "v*"], []]
+    assert args.filter_tags == []
+
+
+def test_SimulationArgs_requires_timezone():
+    with pytest.raises(ValueError):
+        SimulationArgs(cut_offs="2024-01-01")
+
+
+def test_candidates_fall_back_to_base_policy(base_policy):
+    assert SimulationArgs().candidates(base_policy) == [base_policy]
+
+    args = SimulationArgs(
+        cut_offs="2023-06-01 UTC;2023-09-01 UTC;2024-01-01 UTC",
+        keep_at_least="0,5",
+    )
+    candidates = args.candidates(base_policy)
+    assert len(candidates) == 6
+    assert all(candidate.skip_tags == ["latest"] for candidate in candidates)
+
+
+def test_candidates_reject_skip_tags_with_untagged_only(base_policy):
+    base_policy = base_policy.model_copy(
+        update={"skip_tags": [], "untagged_only": True}
+    )
+    with pytest.raises(ValueError):
+        SimulationArgs(skip_tags="latest").candidates(base_policy)
+
+
+def test_simulate_matches_apply(base_policy):
+    images = generate_images(2000, seed=7)
+    index = VersionIndex(images)
+    candidates = SimulationArgs(
+        cut_offs="2023-06-01 UTC;2024-01-01 UTC;2024-03-15 UTC",
+        keep_at_least="0,10,100000",
+        skip_tags="latest;latest,v*.*.*;",
+        filter_tags="sha-*,pr-*;",
+    ).candidates(base_policy)
+    results = simulate(index, candidates)
+    assert len(results) == 54
+    for candidate, deleted in results:
+        assert deleted == len(VersionIndex(images).apply(candidate))
+
+    table = format_table(results, len(index)).splitlines()
+    assert table[0].split() == [
+        "cut-off",
+        "keep-at-least",
+        "skip-tags",
+        "filter-tags",
+        "delete",
+        "keep",
+    ]
+    assert len(table) == 55
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import aiohttp
+import pytest
+
+from containercrop import storage
+from containercrop.github_api import Image
+from containercrop.retention import RetentionArgs, VersionIndex
+
+
+class FakeAPI:
+    def __init__(self, blob_sizes):
+        self.blob_sizes = blob_sizes
+        self.requested = []
+
+    async def get_blob_sizes(self, image_name, digest):
+        self.requested.append(digest)
+        blobs = self.blob_sizes.get(digest)
+        if isinstance(blobs, Exception):
+            raise blobs
+        return blobs
+
+
+def make_images(tags_list):
+    "Images named v0, v1, ... where v0 is the newest"
+    now = datetime.now(timezone.utc)
+    return [
+        Image(id=i, name=f"v{i}", updated_at=now - timedelta(days=i), tags=tags)
+        for i, tags in enumerate(tags_list)
+    ]
+
+
+def test_parse_size():
+    assert storage.parse_size("100") == 100
+    assert storage.parse_size("1.5 KB") == 1500
+    assert storage.parse_size("2GiB") == 2 * 1024**3
+    with pytest.raises(ValueError):
+        storage.parse_size("10 parsecs")
+    with pytest.raises(ValueError):
+        storage.parse_size("GB")
+
+
+def test_RetentionArgs_max_total_size():
+    inp = {
+        "image_name": "test",
+        "cut_off": "1 day ago UTC",
+        "skip_tags": "",
+        "repo_owner": "test",
+    }
+    assert RetentionArgs(**inp).max_total_size is None
+    assert RetentionArgs(**inp, max_total_size="").max_total_size is None
+    assert RetentionArgs(**inp, max_total_size="1 MB").max_total_size == 1000**2
+    assert (
+        RetentionArgs(**inp, size_cache=None).size_cache == storage.DEFAULT_SIZE_CACHE
+    )
+    assert RetentionArgs(**inp, size_cache="~/sizes.json").size_cache == (
+        Path.home() / "sizes.json"
+    )
+    with pytest.raises(ValueError):
+        RetentionArgs(**inp, max_total_size="0")
+
+
+def test_size_cache_round_trip(tmp_path):
+    path = tmp_path / "nested" / "sizes.json"
+    cache = storage.SizeCache(path)
+    assert cache.get("sha256:a") is None
+    cache.set("sha256:a", {"sha256:layer": 10})
+    cache.save()
+    assert storage.SizeCache(path).get("sha256:a") == {"sha256:layer": 10}
+
+    path.write_text("not json")
+    assert storage.SizeCache(path).entries == {}
+
+    path.write_text("[]")
+    assert storage.SizeCache(path).get("sha256:a") is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_blob_sizes_uses_cache(tmp_path):
+    images = make_images([[], [], []])
+    api = FakeAPI({"v0": {"a": 1}, "v1": {"a": 1, "b": 2}})
+    cache = storage.SizeCache(tmp_path / "sizes.json")
+    cache.set("v1", {"a": 1, "b": 2})
+
+    sizes = await storage.fetch_blob_sizes(api, "test", images, cache)
+    assert sorted(api.requested) == ["v0", "v2"]
+    assert sizes == {"v0": {"a": 1}, "v1": {"a": 1, "b": 2}}
+
+    api.requested.clear()
+    await storage.fetch_blob_sizes(api, "test", images, storage.SizeCache(cache.path))
+    assert api.requested == ["v2"]  # failed fetches are not cached
+
+
+@pytest.mark.asyncio
+async def test_fetch_blob_sizes_survives_network_errors(tmp_path):
+    images = make_images([[], [], []])
+    api = FakeAPI(
+        {
+            "v0": {"a": 1},
+            "v1": asyncio.TimeoutError(),
+            "v2": aiohttp.ClientConnectionError(),
+        }
+    )
+    cache = storage.SizeCache(tmp_path / "sizes.json")
+
+    sizes = await storage.fetch_blob_sizes(api, "test", images, cache)
+    assert sizes == {"v0": {"a": 1}}
+    assert storage.SizeCache(cache.path).get("v0") == {"a": 1}
+
+
+def test_select_for_budget_counts_shared_layers_once():
+    images = make_images([[], [], [], []])
+    blob_sizes = {
+        "v0": {"base": 100, "app0": 10},
+        "v1": {"base": 100, "app1": 10},
+        "v2": {"base": 100, "app2": 10},
+        "v3": {"old-base": 100, "app3": 10},
+    }
+    # total is 240, deleting v3 frees 110 because its base is not shared
+    selected = storage.select_for_budget(images, images, [], blob_sizes, 200)
+    assert [img.name for img in selected] == ["v3"]
+
+    # afterwards every version only frees its own 10 byte layer
+    selected = storage.select_for_budget(images, images, [], blob_sizes, 125)
+    assert [img.name for img in selected] == ["v3", "v2"]
+
+    selected = storage.select_for_budget(images, images, [], blob_sizes, 1000)
+    assert selected == []
+
+
+def test_select_for_budget_accounts_for_versions_deleted_anyway():
+    images = make_images([[], [], []])
+    blob_sizes = {img.name: {img.name: 100} for img in images}
+    selected = storage.select_for_budget(images, images, images[2:], blob_sizes, 150)
+    assert [img.name for img in selected] == ["v1"]
+
+
+def test_select_for_budget_honors_skip_tags_and_keep_at_least():
+    images = make_images([["v3"], [], ["latest"], [], []])
+    blob_sizes = {img.name: {img.name: 100} for img in images}
+    policy = RetentionArgs(
+        image_name="test",
+        cut_off="30 days ago UTC",
+        skip_tags="latest",
+        keep_at_least=2,
+        repo_owner="test",
+    )
+    candidates = VersionIndex(images).deletable(policy)
+    assert [img.name for img in candidates] == ["v3", "v4"]
+    # v0, v1 and v2 are kept no matter what
+    selected = storage.select_for_budget(images, candidates, [], blob_sizes, 300)
+    assert [img.name for img in selected] == ["v4", "v3"]
+
+
+def test_select_for_budget_skips_when_sizes_are_unknown():
+    images = make_images([[], [], []])
+    blob_sizes = {img.name: {img.name: 100} for img in images[:2]}
+    assert storage.select_for_budget(images, images, [], blob_sizes, 0) == []
+
+
+def test_select_for_budget_selects_nothing_when_budget_is_unreachable():
+    images = make_images([[], [], []])
+    blob_sizes = {img.name: {img.name: 100} for img in images}
+    # only the two oldest may be deleted, the newest alone needs 100 bytes
+    assert storage.select_for_budget(images, images[1:], [], blob_sizes, 50) == []
+    selected = storage.select_for_budget(images, images[1:], [], blob_sizes, 100)
+    assert [img.name for img in selected] == ["v2", "v1"]